@@ -7,15 +7,17 @@ from contextvars import Context
 
 __all__ = ["TaskGroup"]
 
+import asyncio
+import contextlib
 import sys
 from asyncio import events
 from asyncio import exceptions
 from asyncio import tasks
-from collections.abc import AsyncGenerator, Coroutine
+from collections.abc import Callable, Coroutine, Iterable
+from types import TracebackType
 from typing import Any, TypeVar
 
 from exceptiongroup import BaseExceptionGroup
-import contextlib
 from .tasks import task_factory as _task_factory, Task
 from . import install as _install
 
@@ -23,27 +25,75 @@ from typing_extensions import Self
 
 _T = TypeVar("_T")
 
+# bound once here so the per-task and per-exit paths don't re-resolve them
+_current_task = tasks.current_task
+_CancelledError = exceptions.CancelledError
+
+# Since Python 3.8 Tasks propagate all exceptions correctly,
+# except for KeyboardInterrupt and SystemExit which are
+# still considered special.
+_BASE_ERRORS = (SystemExit, KeyboardInterrupt)
+
+if sys.version_info >= (3, 11):
+    # asyncio.Task has cancelling()/uncancel() natively, so there's
+    # nothing to install
+    _install_uncancel = contextlib.nullcontext
+else:
+    _install_uncancel = _install.install_uncancel
+
 
 class TaskGroup:
-    def __init__(self) -> None:
-        self._entered = False
-        self._exiting = False
-        self._aborting = False
-        self._loop = None
-        self._parent_task = None
-        self._parent_cancel_requested = False
-        self._tasks = set()
-        self._errors = []
-        self._base_error = None
-        self._on_completed_fut = None
-        self._cmgr = self._cmgr_factory()
+    __slots__ = (
+        "_entered",
+        "_exiting",
+        "_aborting",
+        "_loop",
+        "_parent_task",
+        "_parent_cancel_requested",
+        "_tasks",
+        "_errors",
+        "_dropped_errors",
+        "_max_retained_errors",
+        "_base_error",
+        "_on_completed_fut",
+        "_uncancel_cm",
+        "_done_cb",
+        "__weakref__",
+    )
+
+    # Child exceptions keep their tracebacks (and so frames and locals) alive;
+    # past max_retained_errors (at least 1) of them we only count the rest, and report the
+    # count in the BaseExceptionGroup's message.  KeyboardInterrupt and
+    # SystemExit are always kept.
+    def __init__(self, *, max_retained_errors: int = 64) -> None:
+        if max_retained_errors < 1:
+            raise ValueError(
+                f"max_retained_errors must be at least 1, got {max_retained_errors!r}"
+            )
+        self._entered: bool = False
+        self._exiting: bool = False
+        self._aborting: bool = False
+        self._loop: events.AbstractEventLoop | None = None
+        self._parent_task: asyncio.Task[Any] | None = None
+        self._parent_cancel_requested: bool = False
+        self._tasks: set[Task[Any]] = set()
+        self._errors: list[BaseException] | None = []
+        self._dropped_errors: int = 0
+        self._max_retained_errors: int = max_retained_errors
+        self._base_error: BaseException | None = None
+        self._on_completed_fut: asyncio.Future[bool] | None = None
+        self._uncancel_cm: contextlib.AbstractAsyncContextManager[None] | None = None
 
     def __repr__(self) -> str:
+        if not (self._entered or self._tasks or self._errors or self._dropped_errors):
+            # never entered (the usual case for misuse errors), so nothing
+            # to report; _aborting can't be set without entering either
+            return "<TaskGroup>"
         info = [""]
         if self._tasks:
             info.append(f"tasks={len(self._tasks)}")
-        if self._errors:
-            info.append(f"errors={len(self._errors)}")
+        if self._errors or self._dropped_errors:
+            info.append(f"errors={len(self._errors or ()) + self._dropped_errors}")
         if self._aborting:
             info.append("cancelling")
         elif self._entered:
@@ -52,111 +102,170 @@ class TaskGroup:
         info_str = " ".join(info)
         return f"<TaskGroup{info_str}>"
 
-    @contextlib.asynccontextmanager
-    async def _cmgr_factory(self) -> AsyncGenerator[Self, None]:
+    async def __aenter__(self) -> Self:
         if self._entered:
             raise RuntimeError(f"TaskGroup {self!r} has been already entered")
-        self._entered = True
 
         if self._loop is None:
             self._loop = events.get_running_loop()
 
-        async with _install.install_uncancel():
-            self._parent_task = tasks.current_task(self._loop)
-            if self._parent_task is None:
-                raise RuntimeError(
-                    f"TaskGroup {self!r} cannot determine the parent task"
-                )
-
-            try:
-                yield self
-            finally:
-                et, exc, _ = sys.exc_info()
-                self._exiting = True
-                propagate_cancellation_error = (
-                    exc if et is exceptions.CancelledError else None
-                )
+        self._uncancel_cm = _install_uncancel()
+        await self._uncancel_cm.__aenter__()
 
-            if self._parent_cancel_requested:
-                # If this flag is set we *must* call uncancel().
-                if self._parent_task.uncancel() == 0:
-                    # If there are no pending cancellations left,
-                    # don't propagate CancelledError.
-                    propagate_cancellation_error = None
+        self._parent_task = _current_task(self._loop)
+        if self._parent_task is None:
+            await self._uncancel_cm.__aexit__(None, None, None)
+            raise RuntimeError(f"TaskGroup {self!r} cannot determine the parent task")
 
-                if et is not None:
+        # only now, so create_task() can't accept work without a parent task
+        self._entered = True
+
+        # one bound method shared by every child, rather than a fresh one
+        # per add_done_callback() call; it refers back to us, so __aexit__
+        # deletes it again to leave no reference cycle behind
+        self._done_cb: Callable[[Task[Any]], None] = self._on_task_done
+
+        return self
+
+    async def __aexit__(
+        self,
+        et: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        assert self._uncancel_cm is not None
+        try:
+            self._exiting = True
+            propagate_cancellation_error = exc if et is _CancelledError else None
+
+            if et is not None:
+                if not self._aborting:
+                    # Our parent task is being cancelled:
+                    #
+                    #    async with TaskGroup() as g:
+                    #        g.create_task(...)
+                    #        await ...  # <- CancelledError
+                    #
+                    # or there's an exception in "async with":
+                    #
+                    #    async with TaskGroup() as g:
+                    #        g.create_task(...)
+                    #        1 / 0
+                    #
+                    self._abort()
+
+            # We use while-loop here because "self._on_completed_fut"
+            # can be cancelled multiple times if our parent task
+            # is being cancelled repeatedly (or even once, when
+            # our own cancellation is already in progress)
+            #
+            # optimization: if every child has already finished (e.g. they
+            # all completed eagerly) the loop body never runs, so no future
+            # is created and we don't yield to the event loop at all.  Nothing
+            # can finish a task between creating the future and awaiting it,
+            # so there's no need to re-check self._tasks in between.
+            assert self._loop is not None
+            create_future = self._loop.create_future
+            while self._tasks:
+                if self._on_completed_fut is None:
+                    self._on_completed_fut = create_future()
+
+                try:
+                    await self._on_completed_fut
+                except _CancelledError as ex:
                     if not self._aborting:
                         # Our parent task is being cancelled:
                         #
-                        #    async with TaskGroup() as g:
-                        #        g.create_task(...)
-                        #        await ...  # <- CancelledError
-                        #
-                        # or there's an exception in "async with":
-                        #
-                        #    async with TaskGroup() as g:
-                        #        g.create_task(...)
-                        #        1 / 0
+                        #    async def wrapper():
+                        #        async with TaskGroup() as g:
+                        #            g.create_task(foo)
                         #
+                        # "wrapper" is being cancelled while "foo" is
+                        # still running.
+                        propagate_cancellation_error = ex
                         self._abort()
 
-                # We use while-loop here because "self._on_completed_fut"
-                # can be cancelled multiple times if our parent task
-                # is being cancelled repeatedly (or even once, when
-                # our own cancellation is already in progress)
-                while self._tasks:
-                    if self._on_completed_fut is None:
-                        self._on_completed_fut = self._loop.create_future()
-
-                    try:
-                        await self._on_completed_fut
-                    except exceptions.CancelledError as ex:
-                        if not self._aborting:
-                            # Our parent task is being cancelled:
-                            #
-                            #    async def wrapper():
-                            #        async with TaskGroup() as g:
-                            #            g.create_task(foo)
-                            #
-                            # "wrapper" is being cancelled while "foo" is
-                            # still running.
-                            propagate_cancellation_error = ex
-                            self._abort()
-
-                    self._on_completed_fut = None
-
-                assert not self._tasks
+                self._on_completed_fut = None
+
+            assert not self._tasks
 
+            if self._parent_cancel_requested:
+                assert self._parent_task is not None
+                # If this flag is set we *must* call uncancel().
+                if self._parent_task.uncancel() == 0:
+                    # If there are no pending cancellations left,
+                    # don't propagate CancelledError.
+                    propagate_cancellation_error = None
+
+            # optimization: on the common, successful exit none of the
+            # branches below apply, so skip them all and fall through to the
+            # else: clause, which unwinds install_uncancel()
+            if (
+                et is not None
+                or self._errors
+                or self._dropped_errors
+                or propagate_cancellation_error is not None
+                or self._base_error is not None
+            ):
                 if self._base_error is not None:
                     raise self._base_error
 
                 # Propagate CancelledError if there is one, except if there
                 # are other errors -- those have priority.
-                if propagate_cancellation_error and not self._errors:
+                if propagate_cancellation_error and not (
+                    self._errors or self._dropped_errors
+                ):
                     # The wrapping task was cancelled; since we're done with
                     # closing all child tasks, just propagate the cancellation
                     # request now.
                     raise propagate_cancellation_error
 
-                if et is not None and et is not exceptions.CancelledError:
+                if et is not None and et is not _CancelledError:
                     assert self._errors is not None
+                    assert exc is not None
                     self._errors.append(exc)
 
-                if self._errors:
+                if self._errors or self._dropped_errors:
                     # Exceptions are heavy objects that can have object
                     # cycles (bad for GC); let's not keep a reference to
                     # a bunch of them.
                     errors = self._errors
+                    assert errors
                     self._errors = None
+                    msg = "unhandled errors in a TaskGroup"
+                    if self._dropped_errors:
+                        msg = f"{msg} ({self._dropped_errors} more not retained)"
 
-                    me = BaseExceptionGroup("unhandled errors in a TaskGroup", errors)
+                    me = BaseExceptionGroup(msg, errors)
                     raise me from None
-
-    async def __aenter__(self) -> Self:
-        return await self._cmgr.__aenter__()
-
-    async def __aexit__(self, *exc_info) -> bool | None:
-        return await self._cmgr.__aexit__(*exc_info)  # type: ignore
+        except BaseException as e:
+            # unwind install_uncancel() with whatever we're raising
+            if not await self._uncancel_cm.__aexit__(type(e), e, e.__traceback__):
+                raise
+        else:
+            await self._uncancel_cm.__aexit__(et, exc, tb)
+        finally:
+            # A long-lived TaskGroup object must not keep the parent task
+            # or any exceptions (and through their tracebacks, this frame
+            # and its locals) alive once it has exited.
+            self._parent_task = None
+            self._errors = None
+            self._dropped_errors = 0
+            self._base_error = None
+            self._uncancel_cm = None
+            del self._done_cb
+            exc = None
+
+    def _check_can_spawn(self) -> events.AbstractEventLoop:
+        if not self._entered:
+            raise RuntimeError(f"TaskGroup {self!r} has not been entered")
+        if self._exiting and not self._tasks:
+            raise RuntimeError(f"TaskGroup {self!r} is finished")
+        if self._aborting:
+            raise RuntimeError(f"TaskGroup {self!r} is shutting down")
+        loop = self._loop
+        assert loop is not None
+        return loop
 
     def create_task(
         self,
@@ -165,35 +274,59 @@ class TaskGroup:
         name: str | None = None,
         context: Context | None = None,
     ) -> Task[_T]:
-        if not self._entered:
-            raise RuntimeError(f"TaskGroup {self!r} has not been entered")
-        if self._exiting and not self._tasks:
-            raise RuntimeError(f"TaskGroup {self!r} is finished")
-        if self._aborting:
-            raise RuntimeError(f"TaskGroup {self!r} is shutting down")
-        assert self._loop is not None
+        loop = self._check_can_spawn()
+        # the name goes straight to the Task constructor rather than through
+        # asyncio.tasks._set_task_name, which no longer exists on 3.13
         if context is None:
-            task = _task_factory(self._loop, coro)
+            task = _task_factory(loop, coro, name=name)
         else:
-            task = _task_factory(self._loop, coro, context=context)
-        tasks._set_task_name(task, name)  # type: ignore
+            task = _task_factory(loop, coro, name=name, context=context)
         # optimization: Immediately call the done callback if the task is
         # already done (e.g. if the coro was able to complete eagerly),
-        # and skip scheduling a done callback
+        # and skip tracking it or scheduling a done callback
         if task.done():
-            self._on_task_done(task)
-        else:
-            self._tasks.add(task)
-            task.add_done_callback(self._on_task_done)
+            self._done_cb(task)
+            return task
+        self._tasks.add(task)
+        task.add_done_callback(self._done_cb)
         return task
 
-    # Since Python 3.8 Tasks propagate all exceptions correctly,
-    # except for KeyboardInterrupt and SystemExit which are
-    # still considered special.
+    def create_tasks(
+        self,
+        coros: Iterable[Coroutine[Any, Any, _T]],
+        *,
+        context: Context | None = None,
+    ) -> list[Task[_T]]:
+        """Create a task in this group for each of *coros*, in order.
+
+        Equivalent to calling create_task() for each coroutine, but the
+        group's state is only checked once.  Together with the "async with"
+        block this replaces ``asyncio.gather(*coros)``; note that the tasks
+        are returned, so read each one's result() after the block exits.
+        """
+        loop = self._check_can_spawn()
+        task_factory = _task_factory
+        add = self._tasks.add
+        on_done = self._done_cb
+        result = []
+        # _task_factory never starts a task eagerly, so unlike create_task()
+        # there's no already-done case to handle here
+        if context is None:
+            for coro in coros:
+                task = task_factory(loop, coro)
+                add(task)
+                task.add_done_callback(on_done)
+                result.append(task)
+        else:
+            for coro in coros:
+                task = task_factory(loop, coro, context=context)
+                add(task)
+                task.add_done_callback(on_done)
+                result.append(task)
+        return result
 
     def _is_base_error(self, exc: BaseException) -> bool:
-        assert isinstance(exc, BaseException)
-        return isinstance(exc, (SystemExit, KeyboardInterrupt))
+        return isinstance(exc, _BASE_ERRORS)
 
     def _abort(self) -> None:
         self._aborting = True
@@ -202,12 +335,16 @@ class TaskGroup:
             if not t.done():
                 t.cancel()
 
-    def _on_task_done(self, task):
+    def _on_task_done(self, task: Task[Any]) -> None:
         self._tasks.discard(task)
 
-        if self._on_completed_fut is not None and not self._tasks:
-            if not self._on_completed_fut.done():
-                self._on_completed_fut.set_result(True)
+        on_completed_fut = self._on_completed_fut
+        if on_completed_fut is not None and not self._tasks:
+            if not on_completed_fut.done():
+                on_completed_fut.set_result(True)
+            # the future is single-shot and __aexit__ is already awaiting
+            # this one, so drop it now rather than after it wakes up
+            self._on_completed_fut = None
 
         if task.cancelled():
             return
@@ -216,20 +353,29 @@ class TaskGroup:
         if exc is None:
             return
 
-        assert self._errors is not None
-        self._errors.append(exc)
-        if self._is_base_error(exc) and self._base_error is None:
-            self._base_error = exc
+        # __aenter__ sets _parent_task and _loop before it marks the group
+        # as entered (which create_task() requires), and __aexit__ only
+        # clears them and _errors once the last child has finished, so
+        # they can't be None here.
+        errors: list[BaseException] = self._errors  # type: ignore[assignment]
+        if self._is_base_error(exc):
+            if self._base_error is None:
+                self._base_error = exc
+            errors.append(exc)
+        elif len(errors) >= self._max_retained_errors:
+            self._dropped_errors += 1
+        else:
+            errors.append(exc)
 
-        assert self._parent_task is not None
-        assert self._loop is not None
-        if self._parent_task.done():
+        parent_task: asyncio.Task[Any] = self._parent_task  # type: ignore[assignment]
+        if parent_task.done():
             # Not sure if this case is possible, but we want to handle
             # it anyways.
-            self._loop.call_exception_handler(
+            loop: events.AbstractEventLoop = self._loop  # type: ignore[assignment]
+            loop.call_exception_handler(
                 {
                     "message": f"Task {task!r} has errored out but its parent "
-                    f"task {self._parent_task} is already completed",
+                    f"task {parent_task} is already completed",
                     "exception": exc,
                     "task": task,
                 }
@@ -257,4 +403,4 @@ class TaskGroup:
             #                                 # after TaskGroup is finished.
             self._abort()
             self._parent_cancel_requested = True
-            self._parent_task.cancel()
+            parent_task.cancel()